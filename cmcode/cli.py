@@ -1,21 +1,21 @@
 """CLI interface for cmcode."""
 
+import contextlib
+import functools
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator
 
 import click
 from rich.console import Console
-from rich.markdown import Markdown
 from rich.panel import Panel
-from rich.live import Live
-from rich.text import Text
-from rich.status import Status
-from rich.align import Align
 
 from . import __version__
 from .config import Config, get_default_config_template
-from .core import ChatSession
-from .tools import ToolExecutor
+
+if TYPE_CHECKING:
+    # Imported lazily in main() so --version, init and config skip the LLM/tool stack
+    from .core import ChatSession
 
 
 console = Console()
@@ -38,6 +38,13 @@ ROBOT_ART = """
 [dim]  AI assistant with tool-calling superpowers[/dim]
 """
 
+HELP_TEXT = """
+[bold]Commands:[/bold]
+  exit, quit  - End the chat session
+  /reset      - Clear conversation history
+  /help       - Show this help message
+"""
+
 
 def print_tool_call(tool_name: str, arguments: str, verbose: int) -> None:
     """Print tool call information based on verbosity."""
@@ -47,7 +54,86 @@ def print_tool_call(tool_name: str, arguments: str, verbose: int) -> None:
         console.print(f"[dim]  Args: {arguments}[/dim]")
 
 
-def run_interactive(session: ChatSession, config: Config) -> int:
+class _StreamBuffer:
+    """Accumulate streamed chunks and write them out in batches.
+
+    Writing every token separately is expensive (especially through Rich),
+    so chunks are joined and flushed once enough text has accumulated or a
+    newline arrives. With no limit, the buffer only flushes on newlines.
+    An empty chunk always flushes, so text is out before tools print.
+    """
+    
+    def __init__(self, write: Callable[[str], None], limit: int | None = 64):
+        self._write = write
+        self._limit = limit
+        self._parts: list[str] = []
+        self._size = 0
+    
+    def append(self, chunk: str) -> None:
+        """Add a chunk, flushing if the buffer is full, a line ended or the chunk is empty."""
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        if not chunk or "\n" in chunk or (self._limit is not None and self._size >= self._limit):
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write out any buffered text."""
+        if self._parts:
+            self._write("".join(self._parts))
+            self._parts.clear()
+            self._size = 0
+
+
+def _write_console(text: str) -> None:
+    """Write model output to the console without markup, emoji or highlighting."""
+    console.out(text, end="", highlight=False)
+
+
+def _write_stdout(text: str) -> None:
+    """Write model output to stdout and flush once per batch."""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def _processing_status() -> contextlib.AbstractContextManager:
+    """Return a "Processing..." spinner, or a no-op context when stdout is not a TTY."""
+    if sys.stdout.isatty():
+        return console.status("[bold cyan]Processing...[/bold cyan]", spinner="dots")
+    return contextlib.nullcontext()
+
+
+def _first_chunk(stream: Iterator[str]) -> str | None:
+    """Return the first non-empty chunk of a stream, or None if there is none.
+    
+    Tools that run before any text arrives are thereby still covered by the
+    caller's spinner.
+    """
+    return next((chunk for chunk in stream if chunk), None)
+
+
+def _write_stream(buf: _StreamBuffer, first: str, rest: Iterator[str]) -> None:
+    """Write an already-received first chunk and the rest of a stream.
+    
+    Text received before the stream fails is still written out.
+    """
+    try:
+        buf.append(first)
+        for chunk in rest:
+            buf.append(chunk)
+    finally:
+        buf.flush()
+
+
+def _stdout_buffer() -> _StreamBuffer:
+    """Return a stream buffer for plain stdout output.
+    
+    Terminals get a write per 256 characters or line; piped output is
+    only flushed at line boundaries and before tool calls run.
+    """
+    return _StreamBuffer(_write_stdout, limit=256 if sys.stdout.isatty() else None)
+
+
+def run_interactive(session: "ChatSession", config: Config) -> int:
     """Run interactive chat mode."""
     # Show robot ASCII art banner
     console.print(ROBOT_ART)
@@ -67,65 +153,52 @@ def run_interactive(session: ChatSession, config: Config) -> int:
         
         user_input = user_input.strip()
         
-        if not user_input:
-            continue
-        
-        if user_input.lower() in ("exit", "quit"):
-            console.print("[dim]Goodbye![/dim]")
-            return 0
-        
-        if user_input.lower() == "/reset":
-            session.reset()
-            console.print("[dim]Conversation reset.[/dim]\n")
-            continue
-        
-        if user_input.lower() == "/help":
-            console.print("""
-[bold]Commands:[/bold]
-  exit, quit  - End the chat session
-  /reset      - Clear conversation history
-  /help       - Show this help message
-""")
-            continue
+        match user_input.lower():
+            case "":
+                continue
+            case "exit" | "quit":
+                console.print("[dim]Goodbye![/dim]")
+                return 0
+            case "/reset":
+                session.reset()
+                console.print("[dim]Conversation reset.[/dim]\n")
+                continue
+            case "/help":
+                console.print(HELP_TEXT)
+                continue
         
         console.print()
         
         try:
             if config.streaming and config.output_format == "rich":
                 # Show thinking spinner until first chunk arrives
-                response_text = ""
-                first_chunk = True
-                stream_gen = session.chat_stream(user_input)
-                
-                with console.status("[bold cyan]Processing...[/bold cyan]", spinner="dots") as status:
-                    for chunk in stream_gen:
-                        if first_chunk:
-                            status.stop()
-                            console.print("[bold blue]Assistant:[/bold blue] ", end="")
-                            first_chunk = False
-                        console.print(chunk, end="")
-                        response_text += chunk
+                stream_gen = iter(session.chat_stream(user_input))
+                with _processing_status():
+                    first = _first_chunk(stream_gen)
                 
-                if first_chunk:
+                if first is None:
                     # No chunks received, just print empty response
                     console.print("[bold blue]Assistant:[/bold blue] [dim](no response)[/dim]")
+                else:
+                    console.print("[bold blue]Assistant:[/bold blue] ", end="")
+                    _write_stream(_StreamBuffer(_write_console), first, stream_gen)
                 console.print("\n")
             elif config.streaming:
                 # Streaming with plain output (with simple spinner)
                 print("Processing...", end="\r", flush=True)
-                first_chunk = True
-                for chunk in session.chat_stream(user_input):
-                    if first_chunk:
-                        print("                ", end="\r")  # Clear spinner
-                        print("Assistant: ", end="", flush=True)
-                        first_chunk = False
-                    print(chunk, end="", flush=True)
+                stream_gen = iter(session.chat_stream(user_input))
+                first = _first_chunk(stream_gen)
+                if first is not None:
+                    print("                ", end="\r")  # Clear spinner
+                    print("Assistant: ", end="", flush=True)
+                    _write_stream(_stdout_buffer(), first, stream_gen)
                 print("\n")
             else:
                 # Non-streaming with spinner
-                with console.status("[bold cyan]Processing...[/bold cyan]", spinner="dots"):
+                with _processing_status():
                     response = session.chat(user_input)
                 if config.output_format == "rich":
+                    from rich.markdown import Markdown
                     console.print("[bold blue]Assistant:[/bold blue]", Markdown(response))
                 else:
                     print(f"Assistant: {response}")
@@ -140,22 +213,18 @@ def run_interactive(session: ChatSession, config: Config) -> int:
     return 0
 
 
-def run_single_query(session: ChatSession, config: Config, query: str) -> int:
+def run_single_query(session: "ChatSession", config: Config, query: str) -> int:
     """Run a single query and exit."""
     try:
         if config.streaming:
-            first_chunk = True
-            stream_gen = session.chat_stream(query)
-            
-            with console.status("[bold cyan]Processing...[/bold cyan]", spinner="dots") as status:
-                for chunk in stream_gen:
-                    if first_chunk:
-                        status.stop()
-                        first_chunk = False
-                    print(chunk, end="", flush=True)
+            stream_gen = iter(session.chat_stream(query))
+            with _processing_status():
+                first = _first_chunk(stream_gen)
+            if first is not None:
+                _write_stream(_stdout_buffer(), first, stream_gen)
             print()
         else:
-            with console.status("[bold cyan]Processing...[/bold cyan]", spinner="dots"):
+            with _processing_status():
                 response = session.chat(query)
             print(response)
         return 0
@@ -239,17 +308,25 @@ def main(
             error_console.print(f"[red]Configuration error:[/red] {error}")
         sys.exit(2)
     
-    # Create tool executor with callback for verbose output
+    from .core import ChatSession
+    from .tools import ToolExecutor
+    
+    # Create tool executor
     tool_executor = ToolExecutor(
         workspace_dir=config.workspace_dir,
         auto_confirm=config.auto_confirm
     )
     
+    # Only report tool calls when verbose; otherwise skip the callback entirely
+    on_tool_call = None
+    if config.verbose:
+        on_tool_call = functools.partial(print_tool_call, verbose=config.verbose)
+    
     # Create session
     session = ChatSession(
         config=config,
         tool_executor=tool_executor,
-        on_tool_call=lambda name, args: print_tool_call(name, args, config.verbose)
+        on_tool_call=on_tool_call
     )
     
     # Determine mode
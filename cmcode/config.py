@@ -1,11 +1,29 @@
 """Configuration handling for cmcode."""
 
+import functools
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
-import yaml
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+# Keys read from config files, in the order they are applied
+_CONFIG_KEYS = (
+    "endpoint",
+    "model",
+    "api_key",
+    "streaming",
+    "auto_confirm",
+    "verbose",
+    "enable_prompt_cache",
+    "system_prompt_path",
+    "workspace_dir",
+    "output_format",
+)
 
 
 @dataclass
@@ -21,6 +39,7 @@ class Config:
     streaming: bool = True
     auto_confirm: bool = False
     verbose: int = 0
+    enable_prompt_cache: bool = False
     
     # Paths
     system_prompt_path: str | None = None
@@ -30,25 +49,32 @@ class Config:
     output_format: str = "rich"  # "rich", "plain", "json"
     
     @classmethod
-    def get_config_paths(cls) -> list[Path]:
-        """Return list of config file paths to check, in priority order."""
+    @functools.lru_cache(maxsize=1)
+    def get_config_paths(cls) -> tuple[Path, ...]:
+        """Return config file paths to check, in priority order (computed once per process)."""
         paths = []
         
         # Current directory
         paths.append(Path.cwd() / ".cmcode.yaml")
         paths.append(Path.cwd() / ".cmcode.yml")
+        if tomllib:
+            paths.append(Path.cwd() / ".cmcode.toml")
         
         # Home directory
         home = Path.home()
         paths.append(home / ".cmcode.yaml")
         paths.append(home / ".cmcode.yml")
+        if tomllib:
+            paths.append(home / ".cmcode.toml")
         
         # XDG config directory
         xdg_config = os.environ.get("XDG_CONFIG_HOME", home / ".config")
         paths.append(Path(xdg_config) / "cmcode" / "config.yaml")
         paths.append(Path(xdg_config) / "cmcode" / "config.yml")
+        if tomllib:
+            paths.append(Path(xdg_config) / "cmcode" / "config.toml")
         
-        return paths
+        return tuple(paths)
     
     @classmethod
     def load(cls, config_path: str | None = None) -> "Config":
@@ -78,29 +104,22 @@ class Config:
         return config
     
     def _load_from_file(self, path: Path) -> None:
-        """Load configuration from a YAML file."""
+        """Load configuration from a YAML or TOML file."""
         try:
-            with open(path, "r") as f:
-                data = yaml.safe_load(f) or {}
+            if path.suffix == ".toml":
+                with open(path, "rb") as f:
+                    data = tomllib.load(f)
+            else:
+                import yaml
+                
+                # Prefer the libyaml-backed loader when it is available
+                loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+                with open(path, "r") as f:
+                    data = yaml.load(f, Loader=loader) or {}
             
-            if "endpoint" in data:
-                self.endpoint = data["endpoint"]
-            if "model" in data:
-                self.model = data["model"]
-            if "api_key" in data:
-                self.api_key = data["api_key"]
-            if "streaming" in data:
-                self.streaming = data["streaming"]
-            if "auto_confirm" in data:
-                self.auto_confirm = data["auto_confirm"]
-            if "verbose" in data:
-                self.verbose = data["verbose"]
-            if "system_prompt_path" in data:
-                self.system_prompt_path = data["system_prompt_path"]
-            if "workspace_dir" in data:
-                self.workspace_dir = data["workspace_dir"]
-            if "output_format" in data:
-                self.output_format = data["output_format"]
+            for key in _CONFIG_KEYS:
+                if key in data:
+                    setattr(self, key, data[key])
                 
         except Exception as e:
             # Silently ignore config file errors, use defaults
@@ -146,6 +165,8 @@ def get_default_config_template() -> str:
 # streaming: true          # Stream responses as they arrive
 # auto_confirm: false      # Auto-confirm file overwrites
 # verbose: 0               # Verbosity level (0-2)
+# enable_prompt_cache: false  # Send cache_control on long system prompts; only for endpoints
+#                             # that accept it (Azure OpenAI caches automatically and may reject it)
 
 # Paths
 # system_prompt_path: ./system-prompt.md
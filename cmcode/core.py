@@ -1,13 +1,79 @@
 """Core LLM interaction logic for cmcode."""
 
+import functools
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Generator, Any
-
-from openai import OpenAI
+from typing import Callable, Generator, Any, NamedTuple
 
 from .config import Config
-from .tools import TOOLS, ToolExecutor
+from .tools import READ_ONLY_TOOLS, TOOLS, ToolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize obj to canonical JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True).encode()
+
+
+# Hash of the tool schema, computed once for response cache keys
+_TOOLS_HASH = hashlib.blake2b(_dumps(TOOLS), digest_size=16).hexdigest()
+
+# The tool schema never changes, so it is sent via extra_body, which the SDK
+# merges into the request as-is instead of re-transforming it on every call
+_TOOLS_BODY = {"tools": TOOLS}
+
+# System prompts at least this long are marked for provider-side prompt caching
+_PROMPT_CACHE_MIN_CHARS = 1024
+
+# Size of the pieces a cached response is replayed in when streaming
+_REPLAY_CHUNK_SIZE = 64
+
+
+class _Fn(NamedTuple):
+    """Function part of a tool call assembled from a stream."""
+    name: str
+    arguments: str
+
+
+class _TC(NamedTuple):
+    """Tool call assembled from a stream, shaped like the SDK's objects."""
+    id: str
+    function: _Fn
+
+
+@functools.lru_cache(maxsize=8)
+def _read_prompt(path: str, mtime: float) -> str:
+    """Read a system prompt file; cached per path and modification time."""
+    return Path(path).read_text().strip()
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_http_client():
+    """Return the HTTP client shared by all sessions in this process.
+    
+    Keeping one pooled client alive lets consecutive requests in a
+    tool-calling loop reuse the connection instead of paying for a new
+    TLS handshake. HTTP/2 is used when the optional h2 package is installed.
+    """
+    import importlib.util
+    
+    import httpx
+    from openai import DefaultHttpxClient
+    
+    # DefaultHttpxClient keeps the SDK's own defaults (timeouts, redirects)
+    return DefaultHttpxClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+    )
 
 
 class ChatSession:
@@ -34,67 +100,104 @@ class ChatSession:
         )
         self.on_tool_call = on_tool_call
         
+        # Runs independent read-only tool calls from one turn concurrently (threads start on demand)
+        self._tool_pool = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 2) * 2))
+        
+        from openai import OpenAI
+        
         self.client = OpenAI(
             base_url=config.endpoint,
-            api_key=config.api_key
+            api_key=config.api_key,
+            http_client=_shared_http_client()
         )
         
         self.conversation: list[dict[str, Any]] = []
         
+        # Exact-match response cache: conversation hash -> final response
+        self._cache: dict[str, str] = {}
+        
         # Load system prompt
         system_prompt = self._load_system_prompt()
         if system_prompt:
-            self.conversation.append({"role": "system", "content": system_prompt})
+            self.conversation.append({"role": "system", "content": self._system_content(system_prompt)})
+        
+        # Number of leading system messages kept by reset()
+        self._system_count = len(self.conversation)
     
     def _load_system_prompt(self) -> str | None:
         """Load the system prompt from file."""
+        candidates = []
+        
         # Try explicit path from config
         if self.config.system_prompt_path:
-            path = Path(self.config.system_prompt_path)
-            if path.exists():
-                return path.read_text().strip()
+            candidates.append(self.config.system_prompt_path)
         
         # Try default locations
-        default_paths = [
-            Path(self.config.workspace_dir or ".") / "system-prompt.md",
-            Path(__file__).parent.parent / "system-prompt.md",
-        ]
+        candidates.append(os.path.join(self.config.workspace_dir or ".", "system-prompt.md"))
+        candidates.append(str(Path(__file__).parent.parent / "system-prompt.md"))
         
-        for path in default_paths:
-            if path.exists():
-                return path.read_text().strip()
+        for path in candidates:
+            if os.path.isfile(path):
+                return _read_prompt(os.path.abspath(path), os.stat(path).st_mtime)
         
         return None
     
+    def _system_content(self, system_prompt: str) -> str | list[dict[str, Any]]:
+        """Return the system message content, marking long prompts as cacheable."""
+        if not self.config.enable_prompt_cache or len(system_prompt) <= _PROMPT_CACHE_MIN_CHARS:
+            return system_prompt
+        return [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
+    
     def _send_to_llm(self, stream: bool = False):
         """Send conversation to LLM and return response."""
         return self.client.chat.completions.create(
             model=self.config.model,
             messages=self.conversation,
-            tools=TOOLS,
-            stream=stream
+            stream=stream,
+            extra_body=_TOOLS_BODY
         )
     
+    def _cache_key(self) -> str:
+        """Return the response cache key for the current conversation."""
+        payload = _dumps({"m": self.config.model, "msgs": self.conversation, "t": _TOOLS_HASH})
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+    
     def _handle_tool_calls(self, tool_calls: list) -> None:
         """Execute tool calls and add results to conversation."""
-        for tool_call in tool_calls:
-            function_name = tool_call.function.name
-            function_args = tool_call.function.arguments
-            
-            # Notify callback
-            if self.on_tool_call:
-                self.on_tool_call(function_name, function_args)
-            
-            # Execute the tool
-            result = self.tool_executor.execute(function_name, function_args)
-            
-            # Add tool result to conversation
+        # Independent read-only calls in one turn run in parallel; anything that
+        # writes files or runs commands may depend on earlier calls, so such
+        # turns run in order
+        if len(tool_calls) > 1 and all(tc.function.name in READ_ONLY_TOOLS for tc in tool_calls):
+            for tool_call in tool_calls:
+                self._notify_tool_call(tool_call)
+            results = list(self._tool_pool.map(self._execute_tool_call, tool_calls))
+        else:
+            results = []
+            for tool_call in tool_calls:
+                self._notify_tool_call(tool_call)
+                results.append(self._execute_tool_call(tool_call))
+        
+        # Add tool results to conversation, in the order the calls were made
+        for tool_call, result in zip(tool_calls, results):
             self.conversation.append({
                 "role": "tool",
                 "tool_call_id": tool_call.id,
                 "content": result
             })
     
+    def _notify_tool_call(self, tool_call) -> None:
+        """Report a tool call to the callback, if one is set."""
+        if self.on_tool_call:
+            self.on_tool_call(tool_call.function.name, tool_call.function.arguments)
+    
+    def _execute_tool_call(self, tool_call) -> str:
+        """Execute a single tool call and return its result."""
+        return self.tool_executor.execute(tool_call.function.name, tool_call.function.arguments)
+    
     def chat(self, user_input: str) -> str:
         """
         Send a message and get a complete response (non-streaming).
@@ -107,22 +210,45 @@ class ChatSession:
         """
         self.conversation.append({"role": "user", "content": user_input})
         
+        cache_key = self._cache_key()
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self.conversation.append({"role": "assistant", "content": cached})
+            return cached
+        
+        used_tools = False
         while True:
             response = self._send_to_llm(stream=False)
             response_message = response.choices[0].message
             
             if response_message.tool_calls:
-                # Add assistant's tool call message
-                self.conversation.append(response_message.model_dump())
+                # Add assistant's tool call message with only the fields the API needs
+                self.conversation.append({
+                    "role": "assistant",
+                    "content": response_message.content,
+                    "tool_calls": [
+                        {
+                            "id": tc.id,
+                            "type": "function",
+                            "function": {"name": tc.function.name, "arguments": tc.function.arguments}
+                        }
+                        for tc in response_message.tool_calls
+                    ]
+                })
                 
                 # Execute tools
                 self._handle_tool_calls(response_message.tool_calls)
+                used_tools = True
                 
                 # Continue loop to get next response
             else:
                 # Final response
                 final_response = response_message.content or ""
                 self.conversation.append({"role": "assistant", "content": final_response})
+                
+                # Tool results can change between calls, so only cache direct answers
+                if not used_tools:
+                    self._cache[cache_key] = final_response
                 return final_response
     
     def chat_stream(self, user_input: str) -> Generator[str, None, None]:
@@ -133,17 +259,29 @@ class ChatSession:
             user_input: The user's message
             
         Yields:
-            Chunks of the assistant's response
+            Chunks of the assistant's response, and an empty string before
+            each round of tool calls runs
         """
         self.conversation.append({"role": "user", "content": user_input})
         
+        cache_key = self._cache_key()
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self.conversation.append({"role": "assistant", "content": cached})
+            for i in range(0, len(cached), _REPLAY_CHUNK_SIZE):
+                yield cached[i:i + _REPLAY_CHUNK_SIZE]
+            return
+        
+        used_tools = False
         while True:
             stream = self._send_to_llm(stream=True)
             
-            # Collect the streamed response
-            collected_content = ""
-            collected_tool_calls = []
-            current_tool_call = None
+            # Collect the streamed response. Content and tool-call
+            # fragments are kept as lists and joined once the stream ends.
+            content_parts: list[str] = []
+            tc_ids: list[str | None] = []
+            tc_names: list[list[str]] = []
+            tc_args: list[list[str]] = []
             
             for chunk in stream:
                 if not chunk.choices:
@@ -152,43 +290,49 @@ class ChatSession:
                 
                 # Handle content
                 if delta.content:
-                    collected_content += delta.content
+                    content_parts.append(delta.content)
                     yield delta.content
                 
                 # Handle tool calls (accumulated across chunks)
                 if delta.tool_calls:
                     for tc in delta.tool_calls:
-                        if tc.index is not None:
-                            # Extend list if needed
-                            while len(collected_tool_calls) <= tc.index:
-                                collected_tool_calls.append({
-                                    "id": None,
-                                    "function": {"name": "", "arguments": ""},
-                                    "type": "function"
-                                })
-                            
-                            current = collected_tool_calls[tc.index]
-                            
-                            if tc.id:
-                                current["id"] = tc.id
-                            if tc.function:
-                                if tc.function.name:
-                                    current["function"]["name"] += tc.function.name
-                                if tc.function.arguments:
-                                    current["function"]["arguments"] += tc.function.arguments
+                        idx = tc.index
+                        if idx is None:
+                            continue
+                        
+                        # Grow the accumulators if needed
+                        missing = idx + 1 - len(tc_ids)
+                        if missing > 0:
+                            tc_ids.extend([None] * missing)
+                            tc_names.extend([] for _ in range(missing))
+                            tc_args.extend([] for _ in range(missing))
+                        
+                        if tc.id:
+                            tc_ids[idx] = tc.id
+                        if tc.function:
+                            if tc.function.name:
+                                tc_names[idx].append(tc.function.name)
+                            if tc.function.arguments:
+                                tc_args[idx].append(tc.function.arguments)
+            
+            collected_content = "".join(content_parts)
             
             # Check if we have tool calls to execute
-            if collected_tool_calls and collected_tool_calls[0]["id"]:
-                # Convert to proper tool call objects
-                class ToolCall:
-                    def __init__(self, data):
-                        self.id = data["id"]
-                        self.function = type("Function", (), {
-                            "name": data["function"]["name"],
-                            "arguments": data["function"]["arguments"]
-                        })()
+            if tc_ids and tc_ids[0]:
+                collected_tool_calls = [
+                    {
+                        "id": tc_id,
+                        "function": {"name": "".join(name), "arguments": "".join(args)},
+                        "type": "function"
+                    }
+                    for tc_id, name, args in zip(tc_ids, tc_names, tc_args)
+                ]
                 
-                tool_call_objects = [ToolCall(tc) for tc in collected_tool_calls if tc["id"]]
+                # Convert to proper tool call objects
+                tool_call_objects = [
+                    _TC(id=tc["id"], function=_Fn(tc["function"]["name"], tc["function"]["arguments"]))
+                    for tc in collected_tool_calls if tc["id"]
+                ]
                 
                 # Add assistant message with tool calls
                 self.conversation.append({
@@ -197,17 +341,22 @@ class ChatSession:
                     "tool_calls": collected_tool_calls
                 })
                 
+                # Let the caller flush streamed text before tools print or prompt
+                yield ""
+                
                 # Execute tools
                 self._handle_tool_calls(tool_call_objects)
+                used_tools = True
                 
                 # Continue loop for next response
             else:
                 # Final response (no more tool calls)
                 if collected_content:
                     self.conversation.append({"role": "assistant", "content": collected_content})
+                    if not used_tools:
+                        self._cache[cache_key] = collected_content
                 return
     
     def reset(self) -> None:
         """Reset the conversation, keeping only the system prompt."""
-        system_messages = [m for m in self.conversation if m.get("role") == "system"]
-        self.conversation = system_messages
+        del self.conversation[self._system_count:]
@@ -1,10 +1,24 @@
 """Tool definitions and execution for cmcode."""
 
-import json
+import mmap
 import os
+import re
+import selectors
+import shlex
+import shutil
+import signal
 import subprocess
+import tempfile
+import threading
+import time
+import weakref
 from typing import Any
 
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
 # Tool definitions for OpenAI API
 TOOLS = [
     {
@@ -72,6 +86,207 @@ TOOLS = [
 ]
 
 
+# Largest content write_file accepts, in characters
+MAX_FILE_SIZE = 1_000_000
+
+# Largest raw argument payload, in characters, that is parsed at all. JSON
+# escaping can turn one character into twelve (a character outside the BMP
+# becomes a \uXXXX\uXXXX surrogate pair), so nothing bigger can hold valid
+# content.
+MAX_ARGUMENTS_SIZE = 12 * MAX_FILE_SIZE + 4096
+
+# Tools without side effects, which are safe to run concurrently
+READ_ONLY_TOOLS = frozenset({"get_secret", "read_file"})
+
+# Seconds a bash command may run before it is killed
+BASH_TIMEOUT = 30
+
+# Path fragments that write_file refuses to touch, matched in a single regex pass
+BLOCKED_PATTERNS = (".ssh", ".bashrc", ".zshrc", ".env", "id_rsa", "/etc/", "/usr/", ".git/")
+_BLOCKED_RE = re.compile("|".join(re.escape(pattern) for pattern in BLOCKED_PATTERNS))
+
+# Largest single read() issued when loading a file
+_READ_CHUNK_SIZE = 1 << 20
+
+# Files larger than this are memory-mapped instead of read
+_MMAP_THRESHOLD = 256 * 1024
+
+# Characters encoded per write() when saving a file
+_WRITE_CHUNK_CHARS = 1 << 18
+
+# Raw descriptors must not translate newlines on Windows
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def _read_fd(fd: int, size: int) -> bytes:
+    """
+    Read a file descriptor to EOF.
+    
+    The file is read in chunks of its stat size, capped at _READ_CHUNK_SIZE,
+    until EOF, so a stale or unreported size (e.g. /proc) is still read in
+    full. The chunks are joined once at the end.
+    """
+    chunk_size = min(size, _READ_CHUNK_SIZE) or _READ_CHUNK_SIZE
+    chunks = []
+    while chunk := os.read(fd, chunk_size):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    """Write all of data to fd, normally with a single write() call."""
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _write_text(fd: int, text: str) -> None:
+    """
+    Write text to fd as UTF-8, encoding it in bounded slices.
+    
+    Content up to _WRITE_CHUNK_CHARS is encoded and written in one go;
+    longer content never has a second full-size encoded copy in memory.
+    """
+    for start in range(0, len(text), _WRITE_CHUNK_CHARS):
+        _write_all(fd, text[start:start + _WRITE_CHUNK_CHARS].encode("utf-8"))
+
+
+def _decode_text(data: bytes | mmap.mmap) -> str:
+    """Decode UTF-8 file contents with universal newlines, like text-mode open()."""
+    text = str(data, "utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class _PersistentShell:
+    """
+    A long-lived bash process that runs commands one at a time.
+    
+    Each command runs in a subshell with stdin from /dev/null, so cd, exported
+    variables and exit do not leak between calls, while the cost of starting
+    a shell is paid once instead of per command. Output goes through a pair of
+    FIFOs that are read until every writer has closed them, so, as with a
+    fresh process per command, background jobs a command starts finish
+    writing into that command's result rather than the next one's.
+    """
+    
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self._proc: subprocess.Popen | None = None
+        self._fifos: tuple[str, str] = ("", "")
+        self._cleanup: weakref.finalize | None = None
+        self._lock = threading.Lock()
+    
+    def _start(self) -> None:
+        """Start the shell and create the FIFOs its commands write to."""
+        fifo_dir = tempfile.mkdtemp(prefix="cmcode-")
+        self._cleanup = weakref.finalize(self, shutil.rmtree, fifo_dir, True)
+        self._fifos = (os.path.join(fifo_dir, "out"), os.path.join(fifo_dir, "err"))
+        for path in self._fifos:
+            os.mkfifo(path, 0o600)
+        
+        self._proc = subprocess.Popen(
+            [shutil.which("bash") or "/bin/sh"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd,
+            bufsize=0,
+            start_new_session=True
+        )
+    
+    def run(self, command: str, timeout: float) -> tuple[int, bytes, bytes]:
+        """
+        Run a command and return (exit code, stdout, stderr).
+        
+        Raises subprocess.TimeoutExpired if the command runs longer than
+        timeout; the shell is then killed and restarted on the next call.
+        """
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self.close()
+                self._start()
+            
+            readers: list[int] = []
+            writers: list[int] = []
+            try:
+                # Hold a write end of each FIFO until the shell reports the
+                # exit status, so the readers cannot see EOF before the
+                # command has opened them
+                for path in self._fifos:
+                    readers.append(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+                    writers.append(os.open(path, os.O_WRONLY))
+                
+                out_path, err_path = map(shlex.quote, self._fifos)
+                script = f"( eval {shlex.quote(command)} ) </dev/null >{out_path} 2>{err_path}; echo $?\n"
+                _write_all(self._proc.stdin.fileno(), script.encode("utf-8"))
+                return self._collect(command, timeout, readers, writers)
+            except BaseException:
+                self.close()
+                raise
+            finally:
+                for fd in readers + writers:
+                    os.close(fd)
+    
+    def _collect(
+        self, command: str, timeout: float, readers: list[int], writers: list[int]
+    ) -> tuple[int, bytes, bytes]:
+        """Read output until the exit status arrives and both FIFOs reach EOF."""
+        status = bytearray()
+        buffers = {fd: bytearray() for fd in readers}
+        shell_fd = self._proc.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        
+        with selectors.DefaultSelector() as selector:
+            selector.register(shell_fd, selectors.EVENT_READ)
+            for fd in readers:
+                selector.register(fd, selectors.EVENT_READ)
+            
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                
+                for key, _ in selector.select(remaining):
+                    try:
+                        data = os.read(key.fd, 65536)
+                    except BlockingIOError:
+                        continue
+                    
+                    if key.fd != shell_fd:
+                        if data:
+                            buffers[key.fd] += data
+                        else:
+                            selector.unregister(key.fd)
+                        continue
+                    
+                    if not data:
+                        raise RuntimeError("shell exited unexpectedly")
+                    status += data
+                    if status.endswith(b"\n"):
+                        # The command is done; only its background jobs can
+                        # still hold the FIFOs open
+                        selector.unregister(shell_fd)
+                        while writers:
+                            os.close(writers.pop())
+        
+        return int(status), bytes(buffers[readers[0]]), bytes(buffers[readers[1]])
+    
+    def close(self) -> None:
+        """Kill the shell and anything it started."""
+        proc, self._proc = self._proc, None
+        if proc is not None:
+            if proc.poll() is None:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+            proc.stdin.close()
+            proc.stdout.close()
+        if self._cleanup is not None:
+            self._cleanup()
+
+
 class ToolExecutor:
     """Executes tools with configurable settings."""
     
@@ -85,27 +300,42 @@ class ToolExecutor:
         """
         self.workspace_dir = os.path.abspath(workspace_dir or os.getcwd())
         self.auto_confirm = auto_confirm
+        
+        # Workspace path with a trailing separator, so /work does not admit /workshop
+        self._workspace_prefix = os.path.join(self.workspace_dir, "")
+        
+        # Commands reuse one shell process where pipes can be polled (POSIX)
+        self._shell = _PersistentShell(self.workspace_dir) if os.name == "posix" else None
+        
+        # Tool name -> handler; every handler takes the decoded arguments
+        self._dispatch = {
+            "get_secret": self._get_secret,
+            "read_file": self._read_file,
+            "write_file": self._write_file,
+            "execute_bash": self._execute_bash,
+        }
     
     def execute(self, tool_name: str, tool_arguments: str) -> str:
         """Execute the requested tool and return the result."""
-        if tool_name == "get_secret":
-            return self._get_secret()
-        elif tool_name == "read_file":
-            return self._read_file(tool_arguments)
-        elif tool_name == "write_file":
-            return self._write_file(tool_arguments)
-        elif tool_name == "execute_bash":
-            return self._execute_bash(tool_arguments)
-        else:
+        handler = self._dispatch.get(tool_name)
+        if handler is None:
             return f"Unknown tool: {tool_name}"
+        
+        if len(tool_arguments) > MAX_ARGUMENTS_SIZE:
+            return f"Error: Arguments exceed {MAX_ARGUMENTS_SIZE} character limit"
+        try:
+            arguments = _loads(tool_arguments) if tool_arguments else {}
+        except ValueError as ex:
+            return f"Error: Invalid arguments for {tool_name}: {ex}"
+        
+        return handler(arguments)
     
-    def _get_secret(self) -> str:
+    def _get_secret(self, arguments: dict[str, Any]) -> str:
         """Return the hardcoded secret value."""
         return "42"
     
-    def _read_file(self, tool_arguments: str) -> str:
+    def _read_file(self, arguments: dict[str, Any]) -> str:
         """Read and return file contents."""
-        arguments = json.loads(tool_arguments)
         file_path = arguments.get("file_path")
         
         if not file_path:
@@ -115,18 +345,27 @@ class ToolExecutor:
         if not os.path.isabs(file_path):
             file_path = os.path.join(self.workspace_dir, file_path)
         
-        if not os.path.exists(file_path):
+        try:
+            fd = os.open(file_path, os.O_RDONLY | _O_BINARY)
+        except FileNotFoundError:
             return f"Error: File '{file_path}' not found"
+        except Exception as ex:
+            return f"Error reading file: {str(ex)}"
         
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
+            size = os.fstat(fd).st_size
+            if size > _MMAP_THRESHOLD:
+                # Decode straight from the page cache, skipping the read() copy
+                with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapped:
+                    return _decode_text(mapped)
+            return _decode_text(_read_fd(fd, size))
         except Exception as ex:
             return f"Error reading file: {str(ex)}"
+        finally:
+            os.close(fd)
     
-    def _write_file(self, tool_arguments: str) -> str:
+    def _write_file(self, arguments: dict[str, Any]) -> str:
         """Write content to a file with security checks."""
-        arguments = json.loads(tool_arguments)
         file_path = arguments.get("file_path")
         content = arguments.get("content")
         
@@ -136,7 +375,6 @@ class ToolExecutor:
             return "Error: content parameter is required"
         
         # Size limit (1MB)
-        MAX_FILE_SIZE = 1_000_000
         if len(content) > MAX_FILE_SIZE:
             return f"Error: Content exceeds {MAX_FILE_SIZE} byte limit"
         
@@ -147,58 +385,70 @@ class ToolExecutor:
         full_path = os.path.abspath(file_path)
         
         # Directory sandboxing
-        if not full_path.startswith(self.workspace_dir):
+        if not full_path.startswith(self._workspace_prefix):
             return f"Error: Can only write files within {self.workspace_dir}"
         
         # Blocklist sensitive paths
-        BLOCKED_PATTERNS = [".ssh", ".bashrc", ".zshrc", ".env", "id_rsa", "/etc/", "/usr/", ".git/"]
-        if any(pattern in full_path for pattern in BLOCKED_PATTERNS):
+        if _BLOCKED_RE.search(full_path):
             return "Error: Cannot write to sensitive locations"
         
         try:
-            # Check if file exists and handle confirmation
-            if os.path.exists(file_path) and not self.auto_confirm:
+            # Ensure directory exists
+            directory = os.path.dirname(file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            # Create new files directly; only an existing file needs confirmation
+            flags = os.O_WRONLY | os.O_CREAT | _O_BINARY
+            try:
+                fd = os.open(file_path, flags | (os.O_TRUNC if self.auto_confirm else os.O_EXCL), 0o666)
+            except FileExistsError:
                 confirm = input(f"File '{file_path}' already exists. Overwrite? [y/N]: ")
                 if confirm.lower() != 'y':
                     return f"Write cancelled: File '{file_path}' was not overwritten"
+                fd = os.open(file_path, flags | os.O_TRUNC, 0o666)
             
-            # Ensure directory exists
-            directory = os.path.dirname(file_path)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory)
-            
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(content)
+            try:
+                _write_text(fd, content)
+            finally:
+                os.close(fd)
             return f"Successfully wrote {len(content)} characters to {file_path}"
         except Exception as ex:
             return f"Error writing file: {str(ex)}"
     
-    def _execute_bash(self, tool_arguments: str) -> str:
+    def _execute_bash(self, arguments: dict[str, Any]) -> str:
         """Execute a bash command with timeout."""
-        arguments = json.loads(tool_arguments)
         command = arguments.get("command")
         
         if not command:
             return "Error: command parameter is required"
         
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=self.workspace_dir
-            )
-            
-            output = result.stdout
-            error = result.stderr
+            if self._shell is not None:
+                returncode, stdout, stderr = self._shell.run(command, BASH_TIMEOUT)
+            else:
+                result = subprocess.run(
+                    command,
+                    shell=True,
+                    capture_output=True,
+                    timeout=BASH_TIMEOUT,
+                    cwd=self.workspace_dir
+                )
+                returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
             
-            if result.returncode != 0:
-                return f"Command failed with exit code {result.returncode}\nError: {error}\nOutput: {output}"
+            # Output is captured as bytes and decoded once, only where it is returned
+            if returncode != 0:
+                error = stderr.decode("utf-8", "replace")
+                output = stdout.decode("utf-8", "replace")
+                return f"Command failed with exit code {returncode}\nError: {error}\nOutput: {output}"
             
-            return output if output else "Command executed successfully (no output)"
+            return stdout.decode("utf-8", "replace") if stdout else "Command executed successfully (no output)"
         except subprocess.TimeoutExpired:
-            return "Error: Command timed out after 30 seconds"
+            return f"Error: Command timed out after {BASH_TIMEOUT} seconds"
         except Exception as ex:
             return f"Error executing command: {str(ex)}"
+    
+    def close(self) -> None:
+        """Stop the persistent shell, if one was started."""
+        if self._shell is not None:
+            self._shell.close()
@@ -1,8 +1,18 @@
+import importlib.util
 import os
-import json
+import re
+import shlex
 import subprocess
+from functools import lru_cache
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
+
+# Parse tool arguments with orjson when it is installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 load_dotenv()
 
@@ -82,12 +92,26 @@ tools = [
 ]
 
 
+# The tool list is the same on every turn, so it is passed through extra_body,
+# which the SDK sends as-is instead of re-transforming it for each request
+tools_body = {"tools": tools}
+
+
+# Keep connections alive between the back-to-back requests of a tool-calling
+# loop; use HTTP/2 when the optional h2 package is installed
+http_client = DefaultHttpxClient(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=300)
+)
+
 client = OpenAI(
     base_url=f"{endpoint}",
-    api_key=api_key
+    api_key=api_key,
+    http_client=http_client
 )
 
-# Load system prompt from file
+# Load system prompt from file (read once per process)
+@lru_cache(maxsize=1)
 def load_system_prompt():
     """Load the system prompt from system-prompt.md file."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -96,6 +120,45 @@ def load_system_prompt():
         return f.read().strip()
 
 
+# Security: write_file is sandboxed to the directory containing this script
+ALLOWED_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Security: path fragments write_file refuses, matched in a single regex pass
+BLOCKED_PATTERNS = [".ssh", ".bashrc", ".zshrc", ".env", "id_rsa", "/etc/", "/usr/", ".git/"]
+blocked_paths_re = re.compile("|".join(re.escape(pattern) for pattern in BLOCKED_PATTERNS))
+
+# Characters that need a real shell to interpret (pipes, redirects, quoting,
+# globs, expansions, variable assignments, comments, line breaks)
+SHELL_METACHARACTERS = frozenset("|&;<>()$`\\\"'*?[]{}~=#!%\n")
+
+
+def run_command(command):
+    """
+    Run a command with a 30 second timeout, capturing output as bytes.
+    
+    Simple commands (no shell metacharacters) are exec'd directly, skipping
+    the intermediate /bin/sh; anything else, or anything exec refuses (a
+    shell builtin, a script without a shebang, a file that is not
+    executable), goes through the shell so results match the shell's.
+    """
+    if SHELL_METACHARACTERS.isdisjoint(command):
+        try:
+            return subprocess.run(
+                shlex.split(command),
+                capture_output=True,
+                timeout=30  # 30 second timeout
+            )
+        except OSError:
+            pass
+    
+    return subprocess.run(
+        command,
+        shell=True,
+        capture_output=True,
+        timeout=30  # 30 second timeout
+    )
+
+
 def execute_tool(tool_name, tool_arguments):
     """Execute the requested tool and return the result."""
     if tool_name == "get_secret":
@@ -103,7 +166,7 @@ def execute_tool(tool_name, tool_arguments):
         return "42"
     elif tool_name == "read_file":
         # Parse arguments from JSON
-        arguments = json.loads(tool_arguments)
+        arguments = json_loads(tool_arguments)
         file_path = arguments.get("file_path")
         
         if not file_path:
@@ -122,7 +185,7 @@ def execute_tool(tool_name, tool_arguments):
             return f"Error reading file: {str(ex)}"
     elif tool_name == "write_file":
         # Parse arguments from JSON
-        arguments = json.loads(tool_arguments)
+        arguments = json_loads(tool_arguments)
         file_path = arguments.get("file_path")
         content = arguments.get("content")
         
@@ -137,16 +200,14 @@ def execute_tool(tool_name, tool_arguments):
             return f"Error: Content exceeds {MAX_FILE_SIZE} byte limit"
         
         # Security: Directory sandboxing - restrict to workspace directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        allowed_directory = os.path.abspath(script_dir)
+        allowed_directory = ALLOWED_DIRECTORY
         full_path = os.path.abspath(file_path)
         
         if not full_path.startswith(allowed_directory):
             return f"Error: Can only write files within {allowed_directory}"
         
         # Security: Blocklist sensitive paths
-        BLOCKED_PATTERNS = [".ssh", ".bashrc", ".zshrc", ".env", "id_rsa", "/etc/", "/usr/", ".git/"]
-        if any(pattern in full_path for pattern in BLOCKED_PATTERNS):
+        if blocked_paths_re.search(full_path):
             return "Error: Cannot write to sensitive locations"
         
         try:
@@ -161,15 +222,22 @@ def execute_tool(tool_name, tool_arguments):
             if directory and not os.path.exists(directory):
                 os.makedirs(directory)
             
-            # Write the file contents
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(content)
+            # Write the file contents: encode once, then hand the raw bytes
+            # to os.write until drained (usually a single call)
+            encoded = content.encode("utf-8")
+            fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+            try:
+                view = memoryview(encoded)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
             return f"Successfully wrote {len(content)} characters to {file_path}"
         except Exception as ex:
             return f"Error writing file: {str(ex)}"
     elif tool_name == "execute_bash":
         # Parse arguments from JSON
-        arguments = json.loads(tool_arguments)
+        arguments = json_loads(tool_arguments)
         command = arguments.get("command")
         
         if not command:
@@ -177,21 +245,15 @@ def execute_tool(tool_name, tool_arguments):
         
         try:
             # Execute the bash command with timeout
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=30  # 30 second timeout
-            )
-            
-            output = result.stdout
-            error = result.stderr
+            result = run_command(command)
             
+            # Output is captured as bytes; decode only what is returned
             if result.returncode != 0:
+                error = result.stderr.decode("utf-8", "replace")
+                output = result.stdout.decode("utf-8", "replace")
                 return f"Command failed with exit code {result.returncode}\nError: {error}\nOutput: {output}"
             
-            return output if output else "Command executed successfully (no output)"
+            return result.stdout.decode("utf-8", "replace") if result.stdout else "Command executed successfully (no output)"
         except subprocess.TimeoutExpired:
             return "Error: Command timed out after 30 seconds"
         except Exception as ex:
@@ -201,14 +263,55 @@ def execute_tool(tool_name, tool_arguments):
 
 
 def send_to_llm(conversation):
-    """Send the entire conversation history to the LLM and return the response."""
+    """
+    Send the entire conversation history to the LLM and return its message.
+    
+    The response is streamed: reply text is printed as it arrives, and tool
+    calls are assembled from their deltas before being returned.
+    """
     # 2. Include Tools in API Call
-    completion = client.chat.completions.create(
+    stream = client.chat.completions.create(
         model=deployment_name,
         messages=conversation,
-        tools=tools
+        stream=True,
+        extra_body=tools_body
     )
-    return completion.choices[0].message
+    
+    content_parts = []
+    tool_calls = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        
+        if delta.content:
+            if not content_parts:
+                print("Assistant: ", end="")
+            content_parts.append(delta.content)
+            print(delta.content, end="", flush=True)
+        
+        for tc in delta.tool_calls or ():
+            while len(tool_calls) <= tc.index:
+                tool_calls.append({"id": None, "type": "function", "name": [], "arguments": []})
+            current = tool_calls[tc.index]
+            if tc.id:
+                current["id"] = tc.id
+            if tc.function and tc.function.name:
+                current["name"].append(tc.function.name)
+            if tc.function and tc.function.arguments:
+                current["arguments"].append(tc.function.arguments)
+    
+    message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": tc["id"],
+                "type": "function",
+                "function": {"name": "".join(tc["name"]), "arguments": "".join(tc["arguments"])}
+            }
+            for tc in tool_calls
+        ]
+    return message
 
 
 def main():
@@ -234,14 +337,18 @@ def main():
             response_message = send_to_llm(conversation)
             
             # 3. Detect Tool Call Requests
-            if response_message.tool_calls:
+            if response_message.get("tool_calls"):
+                # End any streamed text before reporting tool calls
+                if response_message["content"]:
+                    print()
+                
                 # Add the assistant's tool call message to conversation
-                conversation.append(response_message.model_dump())
+                conversation.append(response_message)
                 
                 # 4. Execute the Tool
-                for tool_call in response_message.tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = tool_call.function.arguments
+                for tool_call in response_message["tool_calls"]:
+                    function_name = tool_call["function"]["name"]
+                    function_args = tool_call["function"]["arguments"]
                     
                     print(f"[Tool Call] Executing: {function_name}")
                     
@@ -251,16 +358,16 @@ def main():
                     # Add tool result to conversation
                     conversation.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
+                        "tool_call_id": tool_call["id"],
                         "content": result
                     })
                 
                 # 5. Continue the Conversation - Loop will call LLM again
             else:
-                # No more tool calls, we have the final response
-                final_response = response_message.content
+                # No more tool calls, the final response was streamed already
+                final_response = response_message["content"]
                 conversation.append({"role": "assistant", "content": final_response})
-                print(f"Assistant: {final_response}\n")
+                print("\n")
                 break
 
 